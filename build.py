@@ -20,18 +20,35 @@ import re
 import shutil
 import sys
 import json
+import hashlib
+from collections import ChainMap
 from pathlib import Path
 
+try:
+    # google-re2 (opcional): tokenizado en tiempo lineal, sin backtracking
+    import re2
+except ImportError:
+    re2 = None
+
 # Rutas
 SRC_DIR = Path(__file__).parent / 'src'
 INCLUDES_DIR = SRC_DIR / '_includes'
 PAGES_DIR = SRC_DIR / '_pages'
 OUTPUT_DIR = Path(__file__).parent / 'docs'
+MANIFEST_PATH = OUTPUT_DIR / '.build-manifest.json'
+
+# Número de páginas a renderizar a partir del cual se usa un pool de procesos
+PARALLEL_MIN_PAGES = 100
+# Ídem para copiar ficheros estáticos con un pool de threads
+PARALLEL_MIN_FILES = 32
 
 # ─────────────────────────────────────────────
 # Frontmatter parser (YAML-like, sin dependencias)
 # ─────────────────────────────────────────────
 
+KEY_RE = re.compile(r'[a-z_]+:')
+
+
 def parse_frontmatter(content):
     """
     Extrae frontmatter delimitado por --- al inicio del archivo.
@@ -41,27 +58,33 @@ def parse_frontmatter(content):
     if not content.startswith('---'):
         return {}, content
     
-    # Find closing --- that is on its own line
-    lines = content.split('\n')
-    end_line = -1
-    for i in range(1, len(lines)):
-        if lines[i].strip() == '---':
-            end_line = i
-            break
-    
-    if end_line == -1:
+    # Find closing --- that is on its own line, scanning line starts
+    # instead of splitting (and re-joining) the whole page
+    fm_start = content.find('\n') + 1
+    if not fm_start:
         return {}, content
     
-    frontmatter_str = '\n'.join(lines[1:end_line])
-    body = '\n'.join(lines[end_line + 1:]).strip()
+    line_start = fm_start
+    while True:
+        line_end = content.find('\n', line_start)
+        line = content[line_start:] if line_end == -1 else content[line_start:line_end]
+        if line.strip() == '---':
+            break
+        if line_end == -1:
+            return {}, content
+        line_start = line_end + 1
+    
+    frontmatter_str = content[fm_start:line_start - 1]
+    body = '' if line_end == -1 else content[line_end + 1:].strip()
     
     meta = {}
     current_key = None
     current_value_lines = []
     
     for line in frontmatter_str.split('\n'):
-        # Check if this is a new key
-        if re.match(r'^[a-z_]+:', line) and not line.strip().startswith('#'):
+        # Check if this is a new key (a match starts with [a-z_], so it
+        # can never be a # comment line)
+        if KEY_RE.match(line):
             # Save previous key if exists
             if current_key:
                 meta[current_key] = '\n'.join(current_value_lines).strip()
@@ -88,6 +111,148 @@ def parse_frontmatter(content):
 # ─────────────────────────────────────────────
 # Template engine (mustache-like, minimal)
 # ─────────────────────────────────────────────
+#
+# Cada plantilla se compila una sola vez a (ops, keys): una lista de
+# operaciones
+#   ('text', literal)
+#   ('var', slot)
+#   ('default', slot, default_ops)
+#   ('section', slot, ops)
+#   ('include', name)
+# donde slot es el índice de la variable en keys. Al renderizar se buscan
+# las keys en el contexto una vez por plantilla y las operaciones indexan
+# esa lista; el resultado se acumula en trozos que se unen al final.
+
+# El default de {{var|default}} puede contener tokens completos ({{otra}}, {{>inc}})
+TOKEN_RE = (re2 or re).compile(
+    r'\{\{(?:>\s*(.+?)\s*|([#/])(\w+)|(\w+)(?:\|((?:\{\{[^{}\n]*\}\}|[^\n])+?))?)\}\}'
+)
+
+# Includes ya compilados, por nombre (se cargan en load_includes)
+_INCLUDES = {}
+
+
+def compile_template(template):
+    """Tokeniza la plantilla en una sola pasada y devuelve (ops, keys)."""
+    slots = {}
+    ops = _compile_ops(template, slots)
+    return ops, tuple(slots)
+
+
+def _compile_ops(template, slots):
+    ops = []
+    stack = []
+    pos = 0
+    for match in TOKEN_RE.finditer(template):
+        start = match.start()
+        if start > pos:
+            ops.append(('text', template[pos:start]))
+        pos = match.end()
+        include_name, sigil, section_key, key, default = match.groups()
+        
+        if include_name is not None:
+            ops.append(('include', include_name))
+        elif sigil == '#':
+            stack.append((section_key, ops, match.group(0)))
+            ops = []
+        elif sigil == '/':
+            # Find the innermost open section with this key
+            depth = len(stack)
+            while depth and stack[depth - 1][0] != section_key:
+                depth -= 1
+            if depth:
+                while len(stack) > depth:
+                    ops = _close_unclosed(stack, ops)
+                _, parent, _ = stack.pop()
+                parent.append(('section', slots.setdefault(section_key, len(slots)), ops))
+                ops = parent
+            else:
+                print(f'  WARNING: Unmatched section close: {section_key}')
+                ops.append(('text', match.group(0)))
+        elif default is not None:
+            slot = slots.setdefault(key, len(slots))
+            ops.append(('default', slot, _compile_ops(default.strip(), slots)))
+        else:
+            ops.append(('var', slots.setdefault(key, len(slots))))
+    
+    if pos < len(template):
+        ops.append(('text', template[pos:]))
+    
+    while stack:
+        ops = _close_unclosed(stack, ops)
+    
+    return ops
+
+
+def _close_unclosed(stack, ops):
+    """Cierra la sección abierta en la cima de la pila como texto literal."""
+    section_key, parent, opening = stack.pop()
+    print(f'  WARNING: Unclosed section: {section_key}')
+    parent.append(('text', opening))
+    parent.extend(ops)
+    return parent
+
+
+def load_includes():
+    """Lee y compila todos los _includes/*.html una sola vez al inicio del build."""
+    _INCLUDES.clear()
+    for include_path in INCLUDES_DIR.glob('*.html'):
+        _INCLUDES[include_path.stem] = compile_template(include_path.read_text(encoding='utf-8'))
+
+
+def render(compiled, context, out):
+    """
+    Ejecuta una plantilla compilada añadiendo el resultado a la lista out.
+    Secciones e includes se recorren con una pila explícita de frames en vez
+    de recursión; un include que ya está en curso se corta como ciclo.
+    """
+    ops, keys = compiled
+    # Frames: (iterador sobre ops, valores de los slots, nombre del include o None)
+    stack = [(iter(ops), [context.get(key, '') for key in keys], None)]
+    active_includes = set()
+    while stack:
+        frame_ops, values, frame_include = stack[-1]
+        for op in frame_ops:
+            kind = op[0]
+            if kind == 'text':
+                out.append(op[1])
+            elif kind == 'var':
+                out.append(str(values[op[1]]))
+            elif kind == 'default':
+                value = values[op[1]]
+                if value:
+                    out.append(value)
+                else:
+                    # Default is compiled too (it may contain other variables)
+                    stack.append((iter(op[2]), values, None))
+                    break
+            elif kind == 'section':
+                value = values[op[1]]
+                if value and value not in ('false', '0', ''):
+                    stack.append((iter(op[2]), values, None))
+                    break
+            else:
+                include_name = op[1]
+                if include_name in active_includes:
+                    print(f'  WARNING: Include cycle: {include_name}')
+                    out.append(f'<!-- include {include_name} skipped (cycle) -->')
+                    continue
+                try:
+                    include_ops, include_keys = _INCLUDES[include_name]
+                except KeyError:
+                    print(f'  WARNING: Include not found: {include_name}')
+                    out.append(f'<!-- include {include_name} not found -->')
+                    continue
+                active_includes.add(include_name)
+                include_values = [context.get(key, '') for key in include_keys]
+                stack.append((iter(include_ops), include_values, include_name))
+                break
+        else:
+            # Frame exhausted
+            stack.pop()
+            active_includes.discard(frame_include)
+    return out
+
 
 def render_template(template, context):
     """
@@ -97,52 +262,7 @@ def render_template(template, context):
     - {{#section}}...{{/section}}  → Muestra bloque si variable es truthy
     - {{>include_name}}      → Incluye archivo de _includes/
     """
-    
-    # 1. Resolver includes {{>name}}
-    def resolve_include(match):
-        include_name = match.group(1).strip()
-        include_path = INCLUDES_DIR / f'{include_name}.html'
-        if include_path.exists():
-            include_content = include_path.read_text(encoding='utf-8')
-            # Recursively render the include with same context
-            return render_template(include_content, context)
-        else:
-            print(f'  WARNING: Include not found: {include_name}')
-            return f'<!-- include {include_name} not found -->'
-    
-    template = re.sub(r'\{\{>\s*(.+?)\s*\}\}', resolve_include, template)
-    
-    # 2. Conditional sections {{#key}}...{{/key}}
-    def resolve_section(match):
-        key = match.group(1)
-        content = match.group(2)
-        value = context.get(key, '')
-        if value and value not in ('false', '0', ''):
-            return content
-        return ''
-    
-    template = re.sub(r'\{\{#(\w+)\}\}(.*?)\{\{/\1\}\}', resolve_section, template, flags=re.DOTALL)
-    
-    # 3. Variables with defaults {{var|default}}
-    def resolve_var_default(match):
-        key = match.group(1).strip()
-        default = match.group(2).strip()
-        value = context.get(key, '')
-        if value:
-            return value
-        # Default might contain other variables
-        return render_template(default, context) if '{{' in default else default
-    
-    template = re.sub(r'\{\{(\w+)\|(.+?)\}\}', resolve_var_default, template)
-    
-    # 4. Simple variables {{var}}
-    def resolve_var(match):
-        key = match.group(1).strip()
-        return str(context.get(key, ''))
-    
-    template = re.sub(r'\{\{(\w+)\}\}', resolve_var, template)
-    
-    return template
+    return ''.join(render(compile_template(template), context, []))
 
 
 # ─────────────────────────────────────────────
@@ -252,30 +372,42 @@ BLOG_ARTICLE_LAYOUT = """<!DOCTYPE html>
 </html>"""
 
 
+# Layouts compilados una sola vez al importar el módulo
+LAYOUTS = {
+    'tool': compile_template(TOOL_LAYOUT),
+    'blog': compile_template(BLOG_LAYOUT),
+    'blog-article': compile_template(BLOG_ARTICLE_LAYOUT),
+}
+
+
 def get_layout(layout_name):
-    layouts = {
-        'tool': TOOL_LAYOUT,
-        'blog': BLOG_LAYOUT,
-        'blog-article': BLOG_ARTICLE_LAYOUT,
-    }
-    return layouts.get(layout_name, TOOL_LAYOUT)
+    """Devuelve el layout compilado (tool por defecto)."""
+    return LAYOUTS.get(layout_name, LAYOUTS['tool'])
 
 
 # ─────────────────────────────────────────────
 # Build process
 # ─────────────────────────────────────────────
 
-def build_page(page_path, relative_path):
-    """Build a single page from source."""
-    content = page_path.read_text(encoding='utf-8')
+def decode_source(data):
+    """Decodifica un fuente UTF-8 normalizando los saltos de línea como read_text()."""
+    text = data.decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def build_page(content, relative_path):
+    """Build a single page from its source text."""
     meta, body = parse_frontmatter(content)
     
     if not meta:
         # No frontmatter = raw file, copy as-is
         return content
     
-    # Set up context with all meta
-    context = dict(meta)
+    # Set up context with all meta; defaults and content go in an overlay
+    # so meta itself is never copied
+    context = ChainMap({}, meta)
     context.setdefault('og_title', context.get('title', ''))
     context.setdefault('og_description', context.get('description', ''))
     context.setdefault('donation_url', '/donar/')
@@ -293,8 +425,12 @@ def build_page(page_path, relative_path):
     context.setdefault('donation_nostr_url', 'https://njump.me/voidhash@nostr.lol')
     context.setdefault('show_donation_panel', '1')
     
-    # Pre-render the body content (resolve includes like {{>affiliates}} in content)
-    rendered_body = render_template(body, context)
+    # Pre-render the body content (resolve includes like {{>affiliates}} in content).
+    # Bodies without any token (most blog articles) are used as-is
+    if '{{' in body:
+        rendered_body = render_template(body, context)
+    else:
+        rendered_body = body
     context['content'] = rendered_body
     
     # Get layout
@@ -302,45 +438,165 @@ def build_page(page_path, relative_path):
     layout = get_layout(layout_name)
     
     # Render the full page
-    rendered = render_template(layout, context)
+    rendered = ''.join(render(layout, context, []))
     
     return rendered
 
 
+def init_worker(includes):
+    """Inicializa un proceso worker con los includes ya compilados."""
+    global _INCLUDES
+    _INCLUDES = includes
+
+
+def render_page(page):
+    """Worker: renderiza (relative, out_path, content) y devuelve los bytes UTF-8."""
+    relative, _, content = page
+    return build_page(content, relative).encode('utf-8')
+
+
+def iter_pages(root):
+    """Recorre root con os.scandir y devuelve las rutas (str) de todos los .html."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.html'):
+                    yield entry.path
+
+
+def sync_file(src, dst):
+    """
+    Copia src → dst salvo que dst ya esté al día (mismo tamaño y mtime).
+    Intenta un hard link y recurre a copy2 (que conserva el mtime) si falla.
+    Devuelve True si ha actualizado dst.
+    """
+    st_src = os.stat(src)
+    try:
+        st_dst = os.stat(dst)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    else:
+        if st_dst.st_size == st_src.st_size and st_dst.st_mtime_ns == st_src.st_mtime_ns:
+            return False
+        os.remove(dst)
+    
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return True
+
+
+def sync_tree(src, dst, emitted):
+    """
+    Sincroniza el árbol src en dst; añade las rutas destino a emitted y
+    devuelve cuántas cambiaron. Con muchos ficheros se procesan en un pool
+    de threads (link/sendfile liberan el GIL).
+    """
+    src_files = []
+    dst_files = []
+    for dirpath, _, filenames in os.walk(src):
+        for filename in filenames:
+            src_file = os.path.join(dirpath, filename)
+            dst_file = os.path.join(dst, os.path.relpath(src_file, src))
+            emitted.add(dst_file)
+            src_files.append(src_file)
+            dst_files.append(dst_file)
+    
+    if len(src_files) < PARALLEL_MIN_FILES:
+        return sum(map(sync_file, src_files, dst_files))
+    
+    # Imported here: concurrent.futures costs more to import than syncing
+    # a handful of files
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return sum(executor.map(sync_file, src_files, dst_files))
+
+
+def prune_output(root, keep):
+    """Borra de root los ficheros que no están en keep (y los directorios que queden vacíos)."""
+    removed = []
+    for dirpath, _, filenames in os.walk(root, topdown=False):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if path not in keep:
+                os.remove(path)
+                removed.append(path)
+        if dirpath != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
+
+
+def inputs_digest():
+    """
+    Hash de lo que comparten todas las páginas: build.py (motor, layouts,
+    valores por defecto) y el contenido de todos los includes.
+    """
+    digest = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16)
+    for include_path in sorted(INCLUDES_DIR.glob('*.html')):
+        digest.update(include_path.name.encode('utf-8'))
+        digest.update(include_path.read_bytes())
+    return digest.digest()
+
+
+def file_digest(path):
+    """blake2b (hex) del contenido de path, o None si no existe."""
+    try:
+        return hashlib.blake2b(Path(path).read_bytes(), digest_size=16).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest():
+    """Lee docs/.build-manifest.json: {página: [hash entrada, hash salida]}."""
+    try:
+        return json.loads(MANIFEST_PATH.read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
 def build():
     """Full build: process all pages, copy static assets."""
     print('Building Bitcoin Calculadora...\n')
     
-    # Clean output
-    if OUTPUT_DIR.exists():
-        shutil.rmtree(OUTPUT_DIR)
-    OUTPUT_DIR.mkdir(parents=True)
+    load_includes()
+    
+    # Output is updated in place; anything not emitted by this build is
+    # pruned at the end
+    output_root = str(OUTPUT_DIR)
+    os.makedirs(output_root, exist_ok=True)
+    emitted = set()
     
     # Copy static assets
     for static_dir in ['css', 'js']:
         src_static = SRC_DIR / static_dir
         if src_static.exists():
-            dst_static = OUTPUT_DIR / static_dir
-            shutil.copytree(src_static, dst_static)
-            print(f'  Copied {static_dir}/')
+            updated = sync_tree(str(src_static), os.path.join(output_root, static_dir), emitted)
+            print(f'  Copied {static_dir}/ ({updated} updated)')
     
-    # Copy CNAME if exists
-    cname = SRC_DIR / 'CNAME'
-    if cname.exists():
-        shutil.copy2(cname, OUTPUT_DIR / 'CNAME')
-        print('  Copied CNAME')
-    
-    # Copy robots.txt and sitemap.xml if they exist
-    for extra_file in ['robots.txt', 'sitemap.xml']:
+    # Copy CNAME, robots.txt and sitemap.xml if they exist
+    for extra_file in ['CNAME', 'robots.txt', 'sitemap.xml']:
         src_file = SRC_DIR / extra_file
         if src_file.exists():
-            shutil.copy2(src_file, OUTPUT_DIR / extra_file)
-            print(f'  Copied {extra_file}')
+            dst_file = os.path.join(output_root, extra_file)
+            emitted.add(dst_file)
+            if sync_file(str(src_file), dst_file):
+                print(f'  Copied {extra_file}')
     
     # Build pages
-    page_count = 0
-    for page_path in PAGES_DIR.rglob('*.html'):
-        relative = page_path.relative_to(PAGES_DIR)
+    shared_digest = inputs_digest()
+    manifest = load_manifest()
+    new_manifest = {}
+    source_digests = {}
+    pages_root = str(PAGES_DIR)
+    pages = []
+    skipped = 0
+    for page_path in iter_pages(pages_root):
+        relative = os.path.relpath(page_path, pages_root)
+        rel_dir, name = os.path.split(relative)
         
         # Determine output path
         # _pages/index.html → docs/index.html
@@ -348,25 +604,62 @@ def build():
         # _pages/blog/index.html → docs/blog/index.html
         # _pages/blog/que-es-dca.html → docs/blog/que-es-dca/index.html
         
-        if relative.name == 'index.html':
-            out_path = OUTPUT_DIR / relative
-        elif relative.parent == Path('.'):
-            # Top-level page like conversor.html → conversor/index.html
-            out_path = OUTPUT_DIR / relative.stem / 'index.html'
+        if name == 'index.html':
+            out_path = os.path.join(output_root, relative)
         else:
-            # Nested page like blog/que-es-dca.html → blog/que-es-dca/index.html
-            out_path = OUTPUT_DIR / relative.parent / relative.stem / 'index.html'
+            # Page like [blog/]que-es-dca.html → [blog/]que-es-dca/index.html
+            out_path = os.path.join(output_root, rel_dir, name[:-len('.html')], 'index.html')
         
-        out_path.parent.mkdir(parents=True, exist_ok=True)
+        emitted.add(out_path)
         
-        rendered = build_page(page_path, relative)
-        out_path.write_text(rendered, encoding='utf-8')
+        # Skip pages whose inputs and existing output match the manifest
+        # The same bytes are hashed here and decoded for rendering
+        source = Path(page_path).read_bytes()
+        source_digest = hashlib.blake2b(shared_digest, digest_size=16)
+        source_digest.update(source)
+        source_digest = source_digest.hexdigest()
+        entry = manifest.get(relative)
+        if entry and entry[0] == source_digest and file_digest(out_path) == entry[1]:
+            new_manifest[relative] = entry
+            skipped += 1
+            continue
         
-        page_count += 1
-        print(f'  OK {relative} -> {out_path.relative_to(OUTPUT_DIR)}')
+        source_digests[relative] = source_digest
+        pages.append((relative, out_path, decode_source(source)))
     
-    print(f'\nBuild complete! {page_count} pages generated in docs/')
-
+    # Render in-process for small builds: starting the pool costs more than
+    # rendering a few dozen pages. The main process does all the writes
+    cpu_count = os.cpu_count() or 1
+    executor = None
+    if len(pages) >= PARALLEL_MIN_PAGES and cpu_count > 1:
+        # Imported here: concurrent.futures.process (multiprocessing) alone
+        # costs more to import than a small build takes to render
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(initializer=init_worker, initargs=(_INCLUDES,))
+        results = executor.map(render_page, pages, chunksize=max(1, len(pages) // cpu_count))
+    else:
+        results = map(render_page, pages)
+    
+    try:
+        for (relative, out_path, _), data in zip(pages, results):
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            Path(out_path).write_bytes(data)
+            new_manifest[relative] = [
+                source_digests[relative],
+                hashlib.blake2b(data, digest_size=16).hexdigest(),
+            ]
+            print(f'  OK {relative} -> {os.path.relpath(out_path, output_root)}')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    MANIFEST_PATH.write_text(json.dumps(new_manifest, indent=2, sort_keys=True), encoding='utf-8')
+    emitted.add(str(MANIFEST_PATH))
+    
+    for stale in prune_output(output_root, emitted):
+        print(f'  Removed {os.path.relpath(stale, output_root)}')
+    
+    print(f'\nBuild complete! {len(pages)} pages generated, {skipped} unchanged in docs/')
 
 if __name__ == '__main__':
     build()